@@ -1,14 +1,181 @@
-from hashlib import sha1
+from collections import OrderedDict
+from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import hashlib
+import inspect
 import json
-import hmac
+import os
+import re
 import requests
+import tempfile
+import threading
+import time
 import urllib
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import orjson as _json
+except ImportError:
+    import json as _json
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
 
 BASE_URL = 'timetableapi.ptv.vic.gov.au'
+SIG_SEP = '&signature='
+DEVID_PARAM = 'devid'
+# Seconds to wait for a connection and then for each read from it
+TIMEOUT = (3.05, 10)
+# Transient statuses worth retrying; the last response is still returned so raise_for_status reports it.
+# Retry-After is ignored since it may ask for hours of sleep, which TIMEOUT does not bound
+RETRY = Retry(total=3, backoff_factor=0.2, status_forcelist=(429, 500, 502, 503, 504), raise_on_status=False, respect_retry_after_header=False)
+
+# How long cached responses stay fresh (in seconds) when PTV does not send a max-age
+REALTIME_TTL = 10
+SHORT_TTL = 60
+NETWORK_TTL = 60 * 60
+STATIC_TTL = 24 * 60 * 60
+
+_MAX_AGE = re.compile(r'max-age=(\d+)')
+# Characters that never need quoting in a request path
+_SAFE_PATH = re.compile(r'[A-Za-z0-9_.~/,-]*\Z')
+_IPAD = bytes(x ^ 0x36 for x in range(256))
+_OPAD = bytes(x ^ 0x5C for x in range(256))
+
+def _isArray(value):
+    """
+    Indicates if value holds several parameter values (any iterable besides a string)
+    """
+    return isinstance(value, Iterable) and not isinstance(value, (str, bytes))
+
+def _encode_params(items):
+    """
+    Encodes request parameters into a query string
+
+    Parameters
+    ----------
+    items : iterable
+        (name, value) pairs; iterable values are repeated once per element and booleans are sent as true/false
+
+    Returns
+    -------
+    query : str
+        The encoded query string (without the leading '?')
+    """
+    quote_plus = urllib.parse.quote_plus
+    pairs = []
+    for key, value in items:
+        for v in value if _isArray(value) else (value,):
+            if isinstance(v, bool):
+                pairs.append(f"{key}={'true' if v else 'false'}")
+            elif isinstance(v, int):
+                # digits never need quoting
+                pairs.append(f"{key}={v}")
+            else:
+                pairs.append(f"{key}={quote_plus(str(v))}")
+    return '&'.join(pairs)
+
+def _joinPath(path, *segments):
+    """
+    Appends a /name/value segment to path for each (name, value) pair whose value is not None
+    """
+    for name, value in segments:
+        if value is not None:
+            path += f"/{name}/{value}"
+    return path
+
+def _iterItems(response, prefix):
+    """
+    Lazily parses the items under prefix from a streamed response, closing it when done
+    """
+    try:
+        yield from ijson.items(response.raw, prefix)
+    finally:
+        response.close()
+
+def _hmacPads(key):
+    """
+    Hashes the HMAC-SHA1 inner and outer key pads (RFC 2104)
+
+    Parameters
+    ----------
+    key : bytes
+        The API key
+
+    Returns
+    -------
+    pads : tuple
+        SHA-1 objects that have already consumed the inner and outer padded key
+    """
+    if len(key) > 64:
+        key = hashlib.sha1(key).digest()
+    key = key.ljust(64, b'\0')
+    return hashlib.sha1(key.translate(_IPAD)), hashlib.sha1(key.translate(_OPAD))
+
+def _sign(pads, path):
+    """
+    Signs a url path
+
+    Parameters
+    ----------
+    pads : tuple
+        Inner and outer key pads from _hmacPads
+    path : str or bytes
+        The path and query of the url, already ascii encoded if given as bytes
+
+    Returns
+    -------
+    signature : str
+        The hex signature.
+    """
+    # Copying the pre-hashed pads skips one SHA-1 block per pad, which
+    # benchmarks faster than both hmac.digest() and copying an hmac.HMAC
+    inner = pads[0].copy()
+    inner.update(path if isinstance(path, bytes) else path.encode('ascii'))
+    outer = pads[1].copy()
+    outer.update(inner.digest())
+    return outer.hexdigest().upper()
+
+@functools.lru_cache(maxsize=1024)
+def _buildUrl(base_url, pads, dev_id, path, items):
+    """
+    Creates a signed URL, remembering recent results since clients often poll the same urls
+
+    Parameters
+    ----------
+    base_url : str
+        Protocol and host of the API
+    pads : tuple
+        Inner and outer key pads from _hmacPads
+    dev_id : str
+        Developer ID from PTV
+    path : str
+        The target path of the url (e.g '/v3/search/')
+    items : tuple
+        Sorted (name, value, types) triples of request parameters, with iterable values as tuples. types holds
+        the type of the value (or of each element) so that e.g True and 1 are not served the same cached url
+
+    Returns
+    -------
+    url : str
+        The url for the request
+    """
+    if not _SAFE_PATH.match(path):
+        # ',' is left as is for the latitude,longitude segments
+        path = urllib.parse.quote(path, safe='/,')
+    path_q = path + "?" + _encode_params([item[:2] for item in items] + [(DEVID_PARAM, dev_id)])
+    return f"{base_url}{path_q}{SIG_SEP}{_sign(pads, path_q)}"
 
 class PTVClient(object):
     """ Class to make calls to PTV Api """
-    def __init__(self, dev_id, api_key, not_secure=None):
+    __slots__ = ('dev_id', 'api_key', 'protoc', '_key_bytes', '_pads', '_base_url', '_session', '_cache_size', '_cache', '_cache_lock', '_cache_file')
+
+    def __init__(self, dev_id, api_key, not_secure=None, cache_size=0, cache_file=None):
         """
         Initialize a PTVClient
 
@@ -23,13 +190,112 @@ class PTVClient(object):
         -------------------
         not_secure : bool
             Indicates whether or not to use http (default = false)
+        cache_size : int
+            Number of responses to keep, honouring the Cache-Control and ETag headers sent by PTV (default = 0, no caching)
+        cache_file : str
+            Path of a file the cache is loaded from and saved to on close, so responses survive between runs (requires cache_size)
         """
         self.dev_id = dev_id
         self.api_key = api_key
+        self._key_bytes = api_key.encode('utf-8')
+        self._pads = _hmacPads(self._key_bytes)
         if not_secure:
             self.protoc = 'http://'
         else:
             self.protoc = 'https://'
+        self._base_url = self.protoc + BASE_URL
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=RETRY)
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._cache_size = cache_size
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._cache_file = cache_file
+        if cache_size and cache_file and os.path.exists(cache_file):
+            self._loadCache()
+
+    def clear_cache(self):
+        """
+        Forgets all cached responses
+        """
+        with self._cache_lock:
+            self._cache.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Closes the underlying http session and releases its pooled connections
+        """
+        try:
+            if self._cache_size and self._cache_file:
+                self._saveCache()
+        finally:
+            self._session.close()
+
+    def _loadCache(self):
+        """
+        Loads cached responses from the cache file, skipping ones that can no longer be used
+        """
+        now = time.time()
+        cache = OrderedDict()
+        try:
+            with open(self._cache_file) as f:
+                entries = json.load(f)
+            for url, (etag, body, expires) in entries:
+                # expires is compared first so a malformed one is always caught
+                if expires > now or etag:
+                    cache[url] = (etag, body.encode('utf-8'), expires)
+        except (OSError, TypeError, ValueError, AttributeError):
+            # An unreadable, partly written or malformed file just means starting with an empty cache
+            return
+        with self._cache_lock:
+            self._cache.update(cache)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
+
+    def _saveCache(self):
+        """
+        Saves cached responses to the cache file
+        """
+        with self._cache_lock:
+            entries = [(url, (etag, content.decode('utf-8'), expires)) for url, (etag, content, expires) in self._cache.items()]
+        # Write a temporary file and swap it in so an interrupted save never leaves a truncated cache
+        fd, tmp_file = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self._cache_file)))
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(entries, f)
+            os.replace(tmp_file, self._cache_file)
+        except BaseException:
+            os.unlink(tmp_file)
+            raise
+
+    def get_many(self, calls, max_workers=8):
+        """
+        Makes several API calls concurrently
+
+        Parameters
+        ----------
+        calls : Array[tuple]
+            (method_name, args, kwargs) for each call (e.g ('get_stop', (1071, 0), {}))
+
+        Optional Parameters
+        -------------------
+        max_workers : integer
+            Maximum number of requests in flight at once (default = 8)
+
+        Returns
+        -------
+        responses : list
+            Response of each call, in the same order as calls
+        """
+        with ThreadPoolExecutor(max_workers) as executor:
+            return list(executor.map(lambda call: getattr(self, call[0])(*call[1], **call[2]), calls))
 
     def _calculateSignature(self, path):
         """
@@ -37,7 +303,7 @@ class PTVClient(object):
 
         Parameters
         ----------
-        path : str
+        path : str or bytes
             The target path of the url (e.g '/v3/search/')
         
         Returns
@@ -45,11 +311,9 @@ class PTVClient(object):
         signature : str
             The hex signature.
         """
-        key = bytes(self.api_key, 'UTF-8')
-        raw = bytes(path, 'UTF-8')
-        return hmac.new(key, raw, sha1).hexdigest().upper()
+        return _sign(self._pads, path)
         
-    def _getUrl(self, path, params = {}):
+    def _getUrl(self, path, params=None):
         """
         Creates URL
 
@@ -65,12 +329,21 @@ class PTVClient(object):
         url : str
             The url for the request
         """
-        params['devid'] = self.dev_id
-        query = "?" + urllib.parse.urlencode(params,doseq=True)
-        url = self.protoc + BASE_URL + path + query + "&signature=" + self._calculateSignature(path + query)
-        return url
+        items = ()
+        if params:
+            # Iterables become tuples so the items can be hashed by _buildUrl's cache, and the types are
+            # part of the key since True == 1 and False == 0 but they are encoded differently
+            items = []
+            for k, v in params.items():
+                if _isArray(v):
+                    v = tuple(v)
+                    items.append((k, v, tuple(map(type, v))))
+                else:
+                    items.append((k, v, type(v)))
+            items = tuple(sorted(items))
+        return _buildUrl(self._base_url, self._pads, self.dev_id, path, items)
         
-    def _callApi(self, path, params = {}): 
+    def _callApi(self, path, params=None, ttl=0):
         """
         Calls API
 
@@ -80,17 +353,124 @@ class PTVClient(object):
             The target path of the url (e.g '/v3/search/')
         params : dict
             Dictionary containing parameters for request
+        ttl : int
+            Seconds a cached response stays fresh when PTV does not send a max-age (default = 0)
         
         Returns
         -------
         response : dict
             Response of api call as dict
         """
-        response = requests.get(self._getUrl(path, params))
-        response.raise_for_status()
-        return response.json()
+        url = self._getUrl(path, params)
+        if not self._cache_size:
+            response = self._session.get(url, timeout=TIMEOUT)
+            response.raise_for_status()
+            return _json.loads(response.content)
+
+        headers = None
+        with self._cache_lock:
+            entry = self._cache.get(url)
+            if entry is not None and time.time() < entry[2]:
+                self._cache.move_to_end(url)
+                # The raw body is kept so each caller gets its own dict to modify
+                return _json.loads(entry[1])
+        if entry is not None and entry[0]:
+            headers = {'If-None-Match': entry[0]}
+        response = self._session.get(url, headers=headers, timeout=TIMEOUT)
+        if response.status_code == 304 and entry is not None:
+            content = entry[1]
+        else:
+            response.raise_for_status()
+            content = response.content
+        self._storeResponse(url, response, content, ttl)
+        return _json.loads(content)
+
+    def _callApiStream(self, path, params, prefix):
+        """
+        Calls API, parsing the response incrementally
+
+        Parameters
+        ----------
+        path : str
+            The target path of the url (e.g '/v3/search/')
+        params : dict
+            Dictionary containing parameters for request
+        prefix : str
+            ijson prefix of the items to yield (e.g 'departures.item')
+
+        Returns
+        -------
+        items : generator
+            The items under prefix, parsed as they are read from the connection
+        """
+        if ijson is None:
+            raise ImportError("Streaming responses requires ijson (pip install ptv-python-wrapper[stream])")
+        response = self._session.get(self._getUrl(path, params), timeout=TIMEOUT, stream=True)
+        try:
+            response.raise_for_status()
+            response.raw.decode_content = True
+        except BaseException:
+            # _iterItems has not taken ownership yet, so release the pooled connection here
+            response.close()
+            raise
+        return _iterItems(response, prefix)
+
+    def _get(self, path, ttl=0, stream=None, **params):
+        """
+        Calls API with the given parameters, leaving out any that are None
+
+        Parameters
+        ----------
+        path : str
+            The target path of the url (e.g '/v3/search/')
+        ttl : int
+            Seconds a cached response stays fresh when PTV does not send a max-age (default = 0)
+        stream : str
+            If given, the ijson prefix of the items to stream instead of returning the whole response
+        **params
+            Parameters for request
+
+        Returns
+        -------
+        response : dict or generator
+            Response of api call as dict, or a generator of items when streaming
+        """
+        params = {k: v for k, v in params.items() if v is not None}
+        if stream:
+            return self._callApiStream(path, params, stream)
+        return self._callApi(path, params, ttl)
+
+    def _storeResponse(self, url, response, content, ttl):
+        """
+        Stores a response in the cache according to its caching headers
+
+        Parameters
+        ----------
+        url : str
+            The url the response was fetched from
+        response : requests.Response
+            The http response
+        content : bytes
+            Body of the response as sent by PTV
+        ttl : int
+            Seconds the response stays fresh when PTV does not send a max-age
+        """
+        cache_control = response.headers.get('Cache-Control', '')
+        etag = response.headers.get('ETag')
+        max_age = _MAX_AGE.search(cache_control)
+        max_age = int(max_age.group(1)) if max_age else ttl
+        if 'no-store' in cache_control or 'no-cache' in cache_control:
+            max_age = 0
+        with self._cache_lock:
+            if 'no-store' in cache_control or not (etag or max_age):
+                self._cache.pop(url, None)
+                return
+            self._cache[url] = (etag, content, time.time() + max_age)
+            self._cache.move_to_end(url)
+            while len(self._cache) > self._cache_size:
+                self._cache.popitem(last=False)
     
-    def get_departures_from_stop(self, route_type, stop_id, route_id=None, platform_numbers=None, direction_id=None, look_backwards=None, gtfs=None, date_utc=None, max_results=None, include_cancelled = None, expand = None):
+    def get_departures_from_stop(self, route_type, stop_id, route_id=None, platform_numbers=None, direction_id=None, look_backwards=None, gtfs=None, date_utc=None, max_results=None, include_cancelled = None, expand = None, stream=False):
         """
         View departures from a stop
 
@@ -121,33 +501,58 @@ class PTVClient(object):
             Indicates if cancelled services (if they exist) are returned (default = false) - metropolitan train only
         expand : Array[string]
             List objects to be returned in full (i.e. expanded) - options include: all, stop, route, run, direction, disruption
+        stream : boolean
+            Indicates if departures are parsed lazily as they arrive instead of loading the whole response (default = false). Requires ijson.
 
         Returns
         -------
-        Departures : dict
-            Dictionary of departures
-        """
-        path = f"/v3/departures/route_type/{route_type}/stop/{stop_id}"
-        params = {}
-        if route_id:
-            path += f"/route/{route_id}"
-        if platform_numbers:
-            params['platform_numbers'] = platform_numbers
-        if direction_id:
-            params['direction_id'] = direction_id
-        if look_backwards:
-            params['look_backwards'] = look_backwards
-        if gtfs:
-            params['gtfs'] = str(gtfs).lower()
-        if date_utc:
-            params['date_utc'] = date_utc
-        if max_results:
-            params['max_results'] = max_results
-        if include_cancelled:
-            params['include_cancelled'] = str(include_cancelled).lower()
-        if expand:
-            params['expand'] = str(expand).lower()
-        return self._callApi(path, params)
+        Departures : dict or generator
+            Dictionary of departures, or a generator of departure dicts when stream is true
+        """
+        path = _joinPath(f"/v3/departures/route_type/{route_type}/stop/{stop_id}", ('route', route_id))
+        # PTV only knows the lower case names (e.g 'All' is sent as 'all')
+        if isinstance(expand, str):
+            expand = expand.lower()
+        elif expand is not None:
+            expand = [name.lower() for name in expand]
+        return self._get(
+            path,
+            REALTIME_TTL,
+            stream='departures.item' if stream else None,
+            platform_numbers=platform_numbers,
+            direction_id=direction_id,
+            look_backwards=look_backwards,
+            gtfs=gtfs,
+            date_utc=date_utc,
+            max_results=max_results,
+            include_cancelled=include_cancelled,
+            expand=expand,
+        )
+
+    def get_many_departures(self, route_type, stop_ids, max_workers=8, **kwargs):
+        """
+        View departures from several stops, fetched concurrently
+
+        Parameters
+        ----------
+        route_type : integer
+            Number identifying transport mode; values returned via RouteTypes API
+        stop_ids : Array[integer]
+            Identifiers of stops; values returned by Stops API
+
+        Optional Parameters
+        -------------------
+        max_workers : integer
+            Maximum number of requests in flight at once (default = 8)
+        **kwargs
+            Any optional parameter accepted by get_departures_from_stop
+
+        Returns
+        -------
+        Departures : list
+            Dictionary of departures for each stop, in the same order as stop_ids
+        """
+        return self.get_many([('get_departures_from_stop', (route_type, stop_id), kwargs) for stop_id in stop_ids], max_workers)
 
     def get_direction_for_route(self, route_id, route_type=None):
         """
@@ -168,11 +573,8 @@ class PTVClient(object):
         Directions : dict
             The directions that a specified route travels in.
         """
-        path = f"/v3/directions/route/{route_id}"
-        params = {}
-        if route_type:
-            path += f"/route_type/{route_type}"
-        return self._callApi(path, params)
+        path = _joinPath(f"/v3/directions/route/{route_id}", ('route_type', route_type))
+        return self._get(path, NETWORK_TTL)
 
     def get_route_for_direction(self, direction_id):
         """
@@ -189,8 +591,7 @@ class PTVClient(object):
             All routes that travel in the specified direction.
         """
         path = f"/v3/directions/{direction_id}"
-        params = {}
-        return self._callApi(path, params)
+        return self._get(path, NETWORK_TTL)
     
     def get_disruptions(self, route_id=None, stop_id=None, disruption_status=None):
         """
@@ -210,15 +611,8 @@ class PTVClient(object):
         disruptions : dict
             All disruption information (if any exists).
         """
-        path = "/v3/disruptions"
-        params = {}
-        if route_id:
-            path += f"/route/{route_id}"
-        if stop_id:
-            path += f"/stop/{stop_id}"
-        if disruption_status:
-            params['disruption_status'] = disruption_status
-        return self._callApi(path, params)
+        path = _joinPath("/v3/disruptions", ('route', route_id), ('stop', stop_id))
+        return self._get(path, SHORT_TTL, disruption_status=disruption_status)
 
     def get_disruption(self, disruption_id):
         """
@@ -235,8 +629,7 @@ class PTVClient(object):
             Disruption information for the specified disruption ID.
         """
         path = f"/v3/disruptions/{disruption_id}"
-        params = {}
-        return self._callApi(path, params)
+        return self._get(path, SHORT_TTL)
 
     def get_disruption_modes(self):
         """
@@ -248,8 +641,7 @@ class PTVClient(object):
             Disruption specific modes
         """
         path = "/v3/disruptions/modes"
-        params = {}
-        return self._callApi(path, params)
+        return self._get(path, STATIC_TTL)
     
     def get_outlets(self, latitude=None, longitude=None, max_distance=None, max_results=None):
         """
@@ -272,16 +664,11 @@ class PTVClient(object):
             Ticket outlets
         """
         path = "/v3/outlets"
-        params = {}
-        if latitude and longitude:
+        if latitude is not None and longitude is not None:
             path += f"/location/{latitude},{longitude}"
-        if max_distance:
-            params['max_distance'] = max_distance
-        if max_results:
-            params['max_results'] = max_results
-        return self._callApi(path, params)
+        return self._get(path, NETWORK_TTL, max_distance=max_distance, max_results=max_results)
 
-    def get_pattern(self, run_id, route_type, expand, stop_id=None, date_utc=None):
+    def get_pattern(self, run_id, route_type, expand, stop_id=None, date_utc=None, stream=False):
         """
         View the stopping pattern for a specific trip/service run
 
@@ -300,22 +687,25 @@ class PTVClient(object):
             Filter by stop_id; values returned by Stops API
         date_utc : str
             Filter by the date and time of the request (ISO 8601 UTC format)
+        stream : bool
+            Indicates if the pattern's departures are parsed lazily as they arrive instead of loading the whole response (default = false). Requires ijson.
 
         Returns
         -------
-        pattern : dict
-            The stopping pattern of the specified trip/service run and route type.
+        pattern : dict or generator
+            The stopping pattern of the specified trip/service run and route type, or a generator of its departure dicts when stream is true.
         """
         path = f"/v3/pattern/run/{run_id}/route_type/{route_type}"
-        params = {}
-        params['expand'] = expand
-        if stop_id:
-            params['stop_id'] = stop_id
-        if date_utc:
-            params['date_utc'] = date_utc
-        return self._callApi(path, params)
+        return self._get(
+            path,
+            REALTIME_TTL,
+            'departures.item' if stream else None,
+            expand=expand,
+            stop_id=stop_id,
+            date_utc=date_utc,
+        )
     
-    def get_routes(self, route_types=None, route_name=None):
+    def get_routes(self, route_types=None, route_name=None, stream=False):
         """
         View route names and numbers for all routes
 
@@ -325,19 +715,16 @@ class PTVClient(object):
             Filter by route_type; values returned via RouteTypes API
         route_name : str
             Filter by name of route (accepts partial route name matches)
+        stream : bool
+            Indicates if routes are parsed lazily as they arrive instead of loading the whole response (default = false). Requires ijson.
         
         Returns
         -------
-        routes : dict
-            Route names and numbers for all routes of all route types.
+        routes : dict or generator
+            Route names and numbers for all routes of all route types, or a generator of route dicts when stream is true.
         """
         path = "/v3/routes"
-        params = {}
-        if route_types:
-            params['route_types'] = route_types
-        if route_name:
-            params['route_name'] = route_name
-        return self._callApi(path, params)
+        return self._get(path, NETWORK_TTL, 'routes.item' if stream else None, route_types=route_types, route_name=route_name)
 
     def get_route(self, route_id):
         """
@@ -354,8 +741,7 @@ class PTVClient(object):
             The route name and number for the specified route ID.
         """
         path = f"/v3/routes/{route_id}"
-        params = {}
-        return self._callApi(path, params)
+        return self._get(path, NETWORK_TTL)
 
     def get_route_types(self):
         """
@@ -367,8 +753,7 @@ class PTVClient(object):
             All route types (i.e. identifiers of transport modes) and their names.
         """
         path = "/v3/route_types"
-        params = {}
-        return self._callApi(path, params)
+        return self._get(path, STATIC_TTL)
     
     def get_run(self, run_id, route_type=None):
         """
@@ -389,11 +774,8 @@ class PTVClient(object):
         run : dict
             The trip/service run details for the run ID and route type specified.
         """
-        path = f"/v3/runs/{run_id}"
-        params = {}
-        if route_type:
-            path += f"/route_type/{route_type}"
-        return self._callApi(path, params)
+        path = _joinPath(f"/v3/runs/{run_id}", ('route_type', route_type))
+        return self._get(path, SHORT_TTL)
 
     def get_runs_for_route(self, route_id, route_type=None):
         """
@@ -414,11 +796,8 @@ class PTVClient(object):
         runs : dict
             All trip/service run details for the specified route ID.
         """
-        path = f"/v3/runs/route/{route_id}"
-        params = {}
-        if route_type:
-            path += f"/route_type/{route_type}"
-        return self._callApi(path, params)
+        path = _joinPath(f"/v3/runs/route/{route_id}", ('route_type', route_type))
+        return self._get(path, SHORT_TTL)
 
     def search(self, search_term, route_types=None, latitude=None, longitude=None, max_distance=None, include_addresses=None, include_outlets=None, match_stop_by_suburb=None, match_route_by_suburb=None, match_stop_by_gtfs_stop_id=None):
         """
@@ -455,27 +834,20 @@ class PTVClient(object):
         SearchResponse : dict
             Stops, routes and myki ticket outlets that contain the search term (note: stops and routes are ordered by route_type by default).
         """
-        path = f"/v3/search/{urllib.parse.quote(search_term)}"
-        params = {}
-        if route_types:
-            params['route_types'] = route_types
-        if latitude:
-            params['latitude'] = latitude
-        if longitude:
-            params['longitude'] = longitude
-        if max_distance:
-            params['max_distance'] = max_distance
-        if include_addresses != None:
-            params['include_addresses'] = str(include_addresses).lower()
-        if include_outlets != None:
-            params['include_outlets'] = str(include_outlets).lower()
-        if match_stop_by_suburb != None:
-            params['match_stop_by_suburb'] = str(match_stop_by_suburb).lower()
-        if match_route_by_suburb != None:
-            params['match_route_by_suburb'] = str(match_route_by_suburb).lower()
-        if match_stop_by_gtfs_stop_id != None:
-            params['match_stop_by_gtfs_stop_id'] = str(match_stop_by_gtfs_stop_id).lower()
-        return self._callApi(path, params)
+        path = f"/v3/search/{search_term}"
+        return self._get(
+            path,
+            NETWORK_TTL,
+            route_types=route_types,
+            latitude=latitude,
+            longitude=longitude,
+            max_distance=max_distance,
+            include_addresses=include_addresses,
+            include_outlets=include_outlets,
+            match_stop_by_suburb=match_stop_by_suburb,
+            match_route_by_suburb=match_route_by_suburb,
+            match_stop_by_gtfs_stop_id=match_stop_by_gtfs_stop_id,
+        )
 
     def get_stop(self, stop_id, route_type, stop_location=None, stop_amenities=None, stop_accessibility=None, stop_contact=None, stop_ticket=None, gtfs=None, stop_staffing=None, stop_disruptions=None):
         """
@@ -513,24 +885,18 @@ class PTVClient(object):
             Stop location, amenity and accessibility facility information for the specified stop (metropolitan and V/Line stations only).
         """
         path = f"/v3/stops/{stop_id}/route_type/{route_type}"
-        params = {}
-        if stop_location != None:
-            params['stop_location'] = str(stop_location).lower()
-        if stop_amenities != None:
-            params['stop_amenities'] = str(stop_amenities).lower()
-        if stop_accessibility != None:
-            params['stop_accessibility'] = str(stop_accessibility).lower()
-        if stop_contact != None:
-            params['stop_contact'] = str(stop_contact).lower()
-        if stop_ticket != None:
-            params['stop_ticket'] = str(stop_ticket).lower()
-        if gtfs != None:
-            params['gtfs'] = str(gtfs).lower()
-        if stop_staffing != None:
-            params['stop_staffing'] = str(stop_staffing).lower()
-        if stop_disruptions != None:
-            params['stop_disruptions'] = str(stop_disruptions).lower()
-        return self._callApi(path, params)
+        return self._get(
+            path,
+            NETWORK_TTL,
+            stop_location=stop_location,
+            stop_amenities=stop_amenities,
+            stop_accessibility=stop_accessibility,
+            stop_contact=stop_contact,
+            stop_ticket=stop_ticket,
+            gtfs=gtfs,
+            stop_staffing=stop_staffing,
+            stop_disruptions=stop_disruptions,
+        )
 
     def get_stops_for_route(self, route_id, route_type, direction_id=None, stop_disruptions=None):
         """
@@ -556,12 +922,7 @@ class PTVClient(object):
             All stops on the specified route.
         """
         path = f"/v3/stops/route/{route_id}/route_type/{route_type}"
-        params = {}
-        if direction_id: 
-            params['direction_id'] = direction_id
-        if stop_disruptions:
-            params['stop_disruptions'] = str(stop_disruptions).lower()
-        return self._callApi(path, params)
+        return self._get(path, NETWORK_TTL, direction_id=direction_id, stop_disruptions=stop_disruptions)
 
     def get_stops_for_location(self, latitude, longitude, route_types=None, max_results=None, max_distance=None, stop_disruptions=None):
         """
@@ -591,13 +952,83 @@ class PTVClient(object):
             All stops near the specified location.
         """
         path = f"/v3/stops/location/{latitude},{longitude}"
-        params = {}
-        if route_types:
-            params['route_types'] = route_types
-        if max_results:
-            params['max_results'] = max_results
-        if max_distance:
-            params['max_distance'] = max_distance
-        if stop_disruptions:
-            params['stop_disruptions'] = stop_disruptions
-        return self._callApi(path, params)
+        return self._get(
+            path,
+            NETWORK_TTL,
+            route_types=route_types,
+            max_results=max_results,
+            max_distance=max_distance,
+            stop_disruptions=stop_disruptions,
+        )
+
+def _asyncMethod(name):
+    """
+    Creates a coroutine method that runs the PTVClient method of the same name in the client's executor
+    """
+    method = getattr(PTVClient, name)
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    async def call(self, *args, **kwargs):
+        arguments = signature.bind(self, *args, **kwargs).arguments
+        if arguments.get('stream') or arguments.get('kwargs', {}).get('stream'):
+            # The generator would do its blocking reads on the event loop thread
+            raise ValueError("AsyncPTVClient does not support streaming responses")
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(method, self._client, *args, **kwargs))
+    return call
+
+class AsyncPTVClient(object):
+    """ Class to make calls to PTV Api from asyncio code """
+    __slots__ = ('_client', '_executor')
+
+    def __init__(self, dev_id, api_key, not_secure=None, cache_size=0, cache_file=None, max_workers=16):
+        """
+        Initialize an AsyncPTVClient
+
+        Parameters
+        ----------
+        dev_id : str
+            Developer ID from PTV
+        api_key : str
+            API key from PTV
+
+        Optional Parameters
+        -------------------
+        not_secure : bool
+            Indicates whether or not to use http (default = false)
+        cache_size : int
+            Number of responses to keep, honouring the Cache-Control and ETag headers sent by PTV (default = 0, no caching)
+        cache_file : str
+            Path of a file the cache is loaded from and saved to on close, so responses survive between runs (requires cache_size)
+        max_workers : int
+            Maximum number of requests in flight at once (default = 16)
+        """
+        self._client = PTVClient(dev_id, api_key, not_secure, cache_size, cache_file)
+        self._executor = ThreadPoolExecutor(max_workers)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Closes the underlying http session and stops the worker threads
+        """
+        self._executor.shutdown(wait=False)
+        self._client.close()
+
+    def clear_cache(self):
+        """
+        Forgets all cached responses
+        """
+        self._client.clear_cache()
+
+# Every public get_* method and search gets a coroutine twin, except get_many since asyncio.gather does
+# the same without nesting a second thread pool (or letting calls ask for streaming)
+for _name in dir(PTVClient):
+    if (_name.startswith('get_') or _name == 'search') and _name != 'get_many':
+        setattr(AsyncPTVClient, _name, _asyncMethod(_name))
+del _name
@@ -18,5 +18,6 @@ setup(
     ],
     keywords=['ptv', 'melbourne', 'victoria', 'public transport'],
     install_requires=['requests'],
+    extras_require={'fast': ['orjson'], 'stream': ['ijson']},
     tests_require=['pytest'],
 )
\ No newline at end of file
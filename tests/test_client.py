@@ -1,9 +1,24 @@
-from pytest import fixture
-from ptv.client import PTVClient
+import asyncio
+import hmac
+import http.server
+import io
+import json
+import os
+import re
+import requests
+import threading
+import urllib
+from pytest import fixture, importorskip, raises
+from urllib3.util.retry import Retry
+from ptv.client import AsyncPTVClient, PTVClient
 
 DEV_ID = "DEV_ID"
 API_KEY = "API_KEY"
 
+# Set both to run the endpoint tests against the live API instead of canned responses
+LIVE_DEV_ID = os.environ.get('PTV_DEV_ID')
+LIVE_API_KEY = os.environ.get('PTV_API_KEY')
+
 FLINDERS_ST_STATION_STOP_ID = 1071
 ROUTE_ID = 1
 DIRECTION_ID = 1
@@ -13,7 +28,7 @@ LAT = '-37.8182711'
 LON = '144.9648731'
 SEARCH_TERM = 'Flinders St'
 
-EXPECTED_DEPARTURE_KEYS = set([
+EXPECTED_DEPARTURE_KEYS = frozenset({
     'departures',
     'stops',
     'routes',
@@ -21,214 +36,670 @@ EXPECTED_DEPARTURE_KEYS = set([
     'directions',
     'disruptions',
     'status'
-])
+})
 
-EXPECTED_DIRECTION_KEYS = set([
+EXPECTED_DIRECTION_KEYS = frozenset({
     'directions',
     'status'
-])
+})
 
-EXPECTED_DISRUPTIONS_KEYS = set([
+EXPECTED_DISRUPTIONS_KEYS = frozenset({
     'disruptions',
     'status'
-])
+})
 
 
-EXPECTED_DISRUPTION_KEYS = set([
+EXPECTED_DISRUPTION_KEYS = frozenset({
     'disruption',
     'status'
-])
+})
+
+EXPECTED_DISRUPTION_MODES_KEYS = frozenset({
+    'disruption_modes',
+    'status'
+})
 
-EXPECTED_OUTLET_KEYS = set([
+EXPECTED_OUTLET_KEYS = frozenset({
     'outlets',
     'status'
-])
+})
 
-EXPECTED_PATTERN_KEYS = set([
+EXPECTED_PATTERN_KEYS = frozenset({
     'departures',
     'disruptions',
     'status'
-])
+})
 
-EXPECTED_ROUTE_KEYS = set([
+EXPECTED_ROUTE_KEYS = frozenset({
     'route',
     'status'
-])
+})
 
-EXPECTED_ROUTES_KEYS = set([
+EXPECTED_ROUTES_KEYS = frozenset({
     'routes',
     'status'
-])
+})
 
-EXPECTED_ROUTE_TYPE_KEYS = set([
+EXPECTED_ROUTE_TYPE_KEYS = frozenset({
     'route_types',
     'status'
-])
+})
 
-EXPECTED_RUN_KEYS = set([
+EXPECTED_RUN_KEYS = frozenset({
     'runs',
     'status'
-])
+})
 
-EXPECTED_RUNS_KEYS = set([
+EXPECTED_RUNS_KEYS = frozenset({
     'runs',
     'status'
-])
+})
 
-EXPECTED_SEARCH_KEYS = set([
+EXPECTED_SEARCH_KEYS = frozenset({
     'stops',
     'routes',
     'outlets',
     'status'
-])
+})
 
-EXPECTED_STOP_KEYS = set([
+EXPECTED_STOP_KEYS = frozenset({
     'stop',
     'status'
-])
+})
 
-EXPECTED_STOPS_KEYS = set([
+EXPECTED_STOPS_KEYS = frozenset({
     'stops',
     'status'
-])
+})
+class FakeResponse(object):
+    """Stand-in for requests.Response returned by a fake session"""
+    def __init__(self, body, status_code=200, headers=None):
+        self.body = body
+        self.status_code = status_code
+        self.headers = headers or {}
+    @property
+    def content(self):
+        return json.dumps(self.body).encode()
+    @property
+    def raw(self):
+        return io.BytesIO(self.content)
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error")
+    def close(self):
+        pass
+
+STATUS = {'version': '3.0', 'health': 1}
+
+FLINDERS_ST_STOP = {
+    'stop_id': 1071,
+    'stop_name': 'Flinders Street Station',
+    'stop_suburb': 'Melbourne City',
+    'route_type': 0,
+    'stop_latitude': -37.8183327,
+    'stop_longitude': 144.966965,
+    'stop_sequence': 0,
+}
+
+ALAMEIN_ROUTE = {
+    'route_type': 0,
+    'route_id': 1,
+    'route_name': 'Alamein',
+    'route_number': '',
+    'route_gtfs_id': '2-ALM',
+}
+
+DEPARTURE = {
+    'stop_id': 1071,
+    'route_id': 1,
+    'run_id': 951012,
+    'run_ref': '951012',
+    'direction_id': 1,
+    'disruption_ids': [],
+    'scheduled_departure_utc': '2021-03-01T08:02:00Z',
+    'estimated_departure_utc': '2021-03-01T08:03:00Z',
+    'at_platform': False,
+    'platform_number': '1',
+    'flags': 'S_WCA',
+    'departure_sequence': 0,
+}
+
+DISRUPTION = {
+    'disruption_id': 1,
+    'title': 'Alamein line: Buses replace trains',
+    'url': 'http://ptv.vic.gov.au/live-travel-updates/',
+    'description': 'Buses replace trains between Camberwell and Alamein.',
+    'disruption_status': 'Current',
+    'disruption_type': 'Planned Works',
+    'published_on': '2021-02-22T03:00:00Z',
+    'last_updated': '2021-02-22T03:00:00Z',
+    'from_date': '2021-03-01T10:30:00Z',
+    'to_date': '2021-03-01T16:00:00Z',
+    'routes': [ALAMEIN_ROUTE],
+    'stops': [],
+    'colour': '#ffd500',
+    'display_on_board': True,
+    'display_status': False,
+}
+
+RUN = {
+    'run_id': 1,
+    'run_ref': '1',
+    'route_id': 1,
+    'route_type': 0,
+    'final_stop_id': 1071,
+    'destination_name': 'Flinders Street',
+    'status': 'scheduled',
+    'direction_id': 1,
+    'run_sequence': 0,
+    'express_stop_count': 0,
+}
+
+# Responses shaped like those of the live API (trimmed to one item per list), most specific path first
+CANNED_RESPONSES = [
+    (re.compile(r'/v3/departures/'), {
+        'departures': [DEPARTURE],
+        'stops': {'1071': FLINDERS_ST_STOP},
+        'routes': {'1': ALAMEIN_ROUTE},
+        'runs': {'951012': dict(RUN, run_id=951012, run_ref='951012')},
+        'directions': {},
+        'disruptions': {},
+        'status': STATUS,
+    }),
+    (re.compile(r'/v3/directions/'), {
+        'directions': [{
+            'route_direction_description': 'Trains to Flinders Street Station',
+            'direction_id': 1,
+            'direction_name': 'City (Flinders Street)',
+            'route_id': 1,
+            'route_type': 0,
+        }],
+        'status': STATUS,
+    }),
+    (re.compile(r'/v3/disruptions/modes$'), {
+        'disruption_modes': [
+            {'disruption_mode_name': 'metro_train', 'disruption_mode': 1},
+            {'disruption_mode_name': 'metro_tram', 'disruption_mode': 3},
+        ],
+        'status': STATUS,
+    }),
+    (re.compile(r'/v3/disruptions/\d+$'), {'disruption': DISRUPTION, 'status': STATUS}),
+    (re.compile(r'/v3/disruptions'), {
+        'disruptions': {'general': [], 'metro_train': [DISRUPTION], 'metro_tram': [], 'metro_bus': []},
+        'status': STATUS,
+    }),
+    (re.compile(r'/v3/outlets'), {
+        'outlets': [{
+            'outlet_distance': 112.5,
+            'outlet_slid_spid': '1520',
+            'outlet_name': 'Flinders Street Station - Customer Service Centre',
+            'outlet_business': 'PTV Hub',
+            'outlet_latitude': -37.8181,
+            'outlet_longitude': 144.9669,
+            'outlet_suburb': 'Melbourne',
+            'outlet_postcode': 3000,
+            'outlet_business_hour_mon': '6.00am - 8.00pm',
+        }],
+        'status': STATUS,
+    }),
+    (re.compile(r'/v3/pattern/'), {
+        'disruptions': {},
+        'departures': [DEPARTURE],
+        'stops': {'1071': FLINDERS_ST_STOP},
+        'routes': {'1': ALAMEIN_ROUTE},
+        'runs': {'1': RUN},
+        'directions': {},
+        'status': STATUS,
+    }),
+    (re.compile(r'/v3/routes/\d+$'), {'route': ALAMEIN_ROUTE, 'status': STATUS}),
+    (re.compile(r'/v3/routes'), {'routes': [ALAMEIN_ROUTE], 'status': STATUS}),
+    (re.compile(r'/v3/route_types'), {
+        'route_types': [
+            {'route_type_name': 'Train', 'route_type': 0},
+            {'route_type_name': 'Tram', 'route_type': 1},
+            {'route_type_name': 'Bus', 'route_type': 2},
+            {'route_type_name': 'Vline', 'route_type': 3},
+            {'route_type_name': 'Night Bus', 'route_type': 4},
+        ],
+        'status': STATUS,
+    }),
+    (re.compile(r'/v3/runs'), {'runs': [RUN], 'status': STATUS}),
+    (re.compile(r'/v3/search/'), {
+        'stops': [FLINDERS_ST_STOP],
+        'routes': [],
+        'outlets': [],
+        'status': STATUS,
+    }),
+    (re.compile(r'/v3/stops/\d+/route_type/'), {'stop': FLINDERS_ST_STOP, 'status': STATUS}),
+    (re.compile(r'/v3/stops/'), {'stops': [FLINDERS_ST_STOP], 'status': STATUS}),
+]
+
+def canned_get(url, **kwargs):
+    """Answers a request with the recorded response of the matching PTV endpoint"""
+    path = urllib.parse.urlsplit(url).path
+    for pattern, body in CANNED_RESPONSES:
+        if pattern.match(path):
+            return FakeResponse(body)
+    return FakeResponse(None, status_code=404)
+
+def assert_sent(sent, path, **params):
+    """Checks the last request went to path with exactly the given query parameters besides devid and signature"""
+    url = urllib.parse.urlsplit(sent[-1])
+    assert url.path == path
+    query = urllib.parse.parse_qs(url.query)
+    assert query.pop('devid') and query.pop('signature')
+    assert query == params
+
+@fixture
+def sent():
+    """Urls requested by the client fixture"""
+    return []
+
 @fixture
-def client():
+def client(monkeypatch, sent):
     """Instanciate the client class to query API """
-    return PTVClient(DEV_ID,API_KEY)
+    if LIVE_DEV_ID and LIVE_API_KEY:
+        client = PTVClient(LIVE_DEV_ID, LIVE_API_KEY)
+        get = client._session.get
+    else:
+        client = PTVClient(DEV_ID, API_KEY)
+        get = canned_get
+    def record(url, **kwargs):
+        sent.append(url)
+        return get(url, **kwargs)
+    monkeypatch.setattr(client._session, 'get', record)
+    return client
 
 # Departures Test
-def test_get_departures_from_stop(client):
+def test_get_departures_from_stop(client, sent):
     json = client.get_departures_from_stop(0,FLINDERS_ST_STATION_STOP_ID)
     assert isinstance(json, dict)
     assert EXPECTED_DEPARTURE_KEYS.issubset(json.keys())
     assert json['status']['health'] == 1
+    assert_sent(sent, f'/v3/departures/route_type/0/stop/{FLINDERS_ST_STATION_STOP_ID}')
 
-def test_get_departures_from_stop_for_route(client):
-    json = client.get_departures_from_stop(0,FLINDERS_ST_STATION_STOP_ID, ROUTE_ID)
+def test_get_departures_from_stop_for_route(client, sent):
+    json = client.get_departures_from_stop(0,FLINDERS_ST_STATION_STOP_ID, ROUTE_ID, max_results=2, include_cancelled=True, expand=['stop', 'route'])
     assert isinstance(json, dict)
     assert EXPECTED_DEPARTURE_KEYS.issubset(json.keys())
     assert json['status']['health'] == 1
+    assert_sent(sent, f'/v3/departures/route_type/0/stop/{FLINDERS_ST_STATION_STOP_ID}/route/{ROUTE_ID}', expand=['stop', 'route'], include_cancelled=['true'], max_results=['2'])
+
+def test_get_departures_lower_cases_expand(client, sent):
+    client.get_departures_from_stop(0, FLINDERS_ST_STATION_STOP_ID, expand='All')
+    assert_sent(sent, f'/v3/departures/route_type/0/stop/{FLINDERS_ST_STATION_STOP_ID}', expand=['all'])
+    client.get_departures_from_stop(0, FLINDERS_ST_STATION_STOP_ID, expand=['Stop', 'ROUTE'])
+    assert_sent(sent, f'/v3/departures/route_type/0/stop/{FLINDERS_ST_STATION_STOP_ID}', expand=['stop', 'route'])
 
 # Directions Test
-def test_get_direction_for_route(client):
+def test_get_direction_for_route(client, sent):
     json = client.get_direction_for_route(ROUTE_ID)
     assert isinstance(json, dict)
     assert EXPECTED_DIRECTION_KEYS.issubset(json.keys())
     assert json['status']['health'] == 1
+    assert_sent(sent, f'/v3/directions/route/{ROUTE_ID}')
 
-def test_get_route_for_direction(client):
+def test_get_route_for_direction(client, sent):
     json = client.get_route_for_direction(DIRECTION_ID)
     assert isinstance(json, dict)
     assert EXPECTED_DIRECTION_KEYS.issubset(json.keys())
     assert json['status']['health'] == 1
+    assert_sent(sent, f'/v3/directions/{DIRECTION_ID}')
 
-def test_get_direction_for_route_type(client):
+def test_get_direction_for_route_type(client, sent):
     json = client.get_direction_for_route(DIRECTION_ID, route_type=0)
     assert isinstance(json, dict)
     assert EXPECTED_DIRECTION_KEYS.issubset(json.keys())
     assert json['status']['health'] == 1
+    assert_sent(sent, f'/v3/directions/route/{DIRECTION_ID}/route_type/0')
 
 # Disruptions Test
-def test_get_disruptions(client):
-    json = client.get_disruptions()
+def test_get_disruptions(client, sent):
+    json = client.get_disruptions(disruption_status='current')
     assert isinstance(json, dict)
     assert EXPECTED_DISRUPTIONS_KEYS.issubset(json.keys())
     assert json['status']['health'] == 1
+    assert_sent(sent, '/v3/disruptions', disruption_status=['current'])
 
-def test_get_disruptions_on_route(client):
+def test_get_disruptions_on_route(client, sent):
     json = client.get_disruptions(route_id=ROUTE_ID)
     assert isinstance(json, dict)
     assert EXPECTED_DISRUPTIONS_KEYS.issubset(json.keys())
     assert json['status']['health'] == 1
+    assert_sent(sent, f'/v3/disruptions/route/{ROUTE_ID}')
+
+def test_get_disruptions_on_route_and_stop(client, sent):
+    client.get_disruptions(route_id=ROUTE_ID, stop_id=FLINDERS_ST_STATION_STOP_ID)
+    assert_sent(sent, f'/v3/disruptions/route/{ROUTE_ID}/stop/{FLINDERS_ST_STATION_STOP_ID}')
 
-def test_get_disruption(client):
+def test_get_disruption(client, sent):
     json = client.get_disruption(DISRUPTION_ID)
     assert isinstance(json, dict)
     assert EXPECTED_DISRUPTION_KEYS.issubset(json.keys())
     assert json['status']['health'] == 1
+    assert_sent(sent, f'/v3/disruptions/{DISRUPTION_ID}')
 
-def test_get_disruption_modes(client):
-    json = client.get_disruption(DISRUPTION_ID)
+def test_get_disruption_modes(client, sent):
+    json = client.get_disruption_modes()
     assert isinstance(json, dict)
-    assert EXPECTED_DISRUPTION_KEYS.issubset(json.keys())
+    assert EXPECTED_DISRUPTION_MODES_KEYS.issubset(json.keys())
     assert json['status']['health'] == 1
+    assert_sent(sent, '/v3/disruptions/modes')
 
 # Outlets Test
-def test_get_outlets(client):
-    json = client.get_outlets(latitude=LAT, longitude=LON)
+def test_get_outlets(client, sent):
+    json = client.get_outlets(latitude=LAT, longitude=LON, max_results=5)
     assert isinstance(json, dict)
     assert EXPECTED_OUTLET_KEYS.issubset(json.keys())
     assert json['status']['health'] == 1
+    assert_sent(sent, f'/v3/outlets/location/{LAT},{LON}', max_results=['5'])
 
 # Patterns Test
-def test_get_pattern(client):
+def test_get_pattern(client, sent):
     json = client.get_pattern(RUN_ID, 0, "all")
     assert isinstance(json, dict)
     assert EXPECTED_PATTERN_KEYS.issubset(json.keys())
     assert json['status']['health'] == 1
+    assert_sent(sent, f'/v3/pattern/run/{RUN_ID}/route_type/0', expand=['all'])
 
 # Routes Test
-def test_get_routes(client):
-    json = client.get_routes()
+def test_get_routes(client, sent):
+    json = client.get_routes(route_types=[0, 1])
     assert isinstance(json, dict)
     assert EXPECTED_ROUTES_KEYS.issubset(json.keys())
     assert json['status']['health'] == 1
+    assert_sent(sent, '/v3/routes', route_types=['0', '1'])
 
-def test_get_route(client):
+def test_get_route(client, sent):
     json = client.get_route(ROUTE_ID)
     assert isinstance(json, dict)
     assert EXPECTED_ROUTE_KEYS.issubset(json.keys())
     assert json['status']['health'] == 1
+    assert json['route']['route_id'] == ROUTE_ID
+    assert_sent(sent, f'/v3/routes/{ROUTE_ID}')
 
 # Route Types Test
-def test_get_route_types(client):
+def test_get_route_types(client, sent):
     """Tests the GET RouteTypes endpoint"""
     json = client.get_route_types()
     assert isinstance(json, dict)
     assert EXPECTED_ROUTE_TYPE_KEYS.issubset(json.keys())
     assert json['status']['health'] == 1
+    assert 0 in {route_type['route_type'] for route_type in json['route_types']}
+    assert_sent(sent, '/v3/route_types')
 
 # Runs Test
-def test_get_run(client):
+def test_get_run(client, sent):
     json = client.get_run(RUN_ID)
     assert isinstance(json, dict)
     assert EXPECTED_RUNS_KEYS.issubset(json.keys())
     assert json['status']['health'] == 1
+    assert_sent(sent, f'/v3/runs/{RUN_ID}')
 
-def test_get_runs_for_route(client):
+def test_get_runs_for_route(client, sent):
     json = client.get_runs_for_route(ROUTE_ID)
     assert isinstance(json, dict)
     assert EXPECTED_RUNS_KEYS.issubset(json.keys())
     assert json['status']['health'] == 1
+    assert_sent(sent, f'/v3/runs/route/{ROUTE_ID}')
 
-def test_get_run_for_route_type(client):
+def test_get_run_for_route_type(client, sent):
     json = client.get_run(RUN_ID, route_type=0)
     assert isinstance(json, dict)
     assert EXPECTED_RUN_KEYS.issubset(json.keys())
     assert json['status']['health'] == 1
+    assert_sent(sent, f'/v3/runs/{RUN_ID}/route_type/0')
 
 # Search Test
-def test_search(client):
-    json = client.search(SEARCH_TERM)
+def test_search(client, sent):
+    json = client.search(SEARCH_TERM, route_types=[0], include_outlets=False)
     assert isinstance(json, dict)
     assert EXPECTED_SEARCH_KEYS.issubset(json.keys())
     assert json['status']['health'] == 1
+    assert_sent(sent, '/v3/search/Flinders%20St', include_outlets=['false'], route_types=['0'])
 
 # Stops Test
-def test_get_stop(client):
-    json = client.get_stop(FLINDERS_ST_STATION_STOP_ID, 0)
+def test_get_stop(client, sent):
+    json = client.get_stop(FLINDERS_ST_STATION_STOP_ID, 0, stop_location=True, stop_amenities=True)
     assert isinstance(json, dict)
     assert EXPECTED_STOP_KEYS.issubset(json.keys())
     assert json['status']['health'] == 1
+    assert json['stop']['stop_id'] == FLINDERS_ST_STATION_STOP_ID
+    assert_sent(sent, f'/v3/stops/{FLINDERS_ST_STATION_STOP_ID}/route_type/0', stop_amenities=['true'], stop_location=['true'])
 
-def test_get_stops_for_route(client):
-    json = client.get_stops_for_route(ROUTE_ID, 0)
+def test_get_stops_for_route(client, sent):
+    json = client.get_stops_for_route(ROUTE_ID, 0, direction_id=DIRECTION_ID)
     assert isinstance(json, dict)
     assert EXPECTED_STOPS_KEYS.issubset(json.keys())
     assert json['status']['health'] == 1
+    assert_sent(sent, f'/v3/stops/route/{ROUTE_ID}/route_type/0', direction_id=[str(DIRECTION_ID)])
 
-def test_get_stops_for_location(client):
-    json = client.get_stops_for_location(LAT,LON)
+def test_get_stops_for_location(client, sent):
+    json = client.get_stops_for_location(LAT,LON, max_distance=500)
     assert isinstance(json, dict)
     assert EXPECTED_STOPS_KEYS.issubset(json.keys())
     assert json['status']['health'] == 1
+    assert_sent(sent, f'/v3/stops/location/{LAT},{LON}', max_distance=['500'])
+
+# Signature Test
+def test_signature_matches_hmac_sha1():
+    client = PTVClient(DEV_ID, API_KEY)
+    path = '/v3/route_types?devid=DEV_ID'
+    expected = hmac.new(API_KEY.encode(), path.encode(), 'sha1').hexdigest().upper()
+    assert client._calculateSignature(path) == expected
+
+# Url Test
+def test_get_url_does_not_accumulate_params(client):
+    params = {'max_results': 1}
+    assert client._getUrl('/a') == client._getUrl('/a')
+    assert client._getUrl('/a', params) == client._getUrl('/a', params)
+    assert params == {'max_results': 1}
+
+def test_get_url_expands_iterable_params(client):
+    expected = client._getUrl('/v3/routes', {'route_types': [0, 1]})
+    assert 'route_types=0&route_types=1&' in expected
+    assert client._getUrl('/v3/routes', {'route_types': {0, 1}}) == expected
+    assert client._getUrl('/v3/routes', {'route_types': range(2)}) == expected
+    assert client._getUrl('/v3/routes', {'route_types': (t for t in (0, 1))}) == expected
+
+def test_search_term_is_quoted(client, sent):
+    client.search('Flinders St')
+    assert sent[-1].startswith('https://timetableapi.ptv.vic.gov.au/v3/search/Flinders%20St?')
+    client.search('Café Bürger')
+    assert sent[-1].startswith('https://timetableapi.ptv.vic.gov.au/v3/search/Caf%C3%A9%20B%C3%BCrger?')
+
+def test_safe_path_is_sent_unchanged(client, sent):
+    client.get_stops_for_location(-37.8, 144.9)
+    assert sent[-1].startswith('https://timetableapi.ptv.vic.gov.au/v3/stops/location/-37.8,144.9?')
+
+def test_get_url_tells_bools_from_ints(client):
+    assert 'include_cancelled=0&' in client._getUrl('/p', {'include_cancelled': 0})
+    assert 'include_cancelled=false&' in client._getUrl('/p', {'include_cancelled': False})
+    assert 'look_backwards=1&' in client._getUrl('/p', {'look_backwards': 1})
+    assert 'look_backwards=true&' in client._getUrl('/p', {'look_backwards': True})
+    assert 'route_types=1&' in client._getUrl('/p', {'route_types': [1]})
+    assert 'route_types=true&' in client._getUrl('/p', {'route_types': [True]})
+
+def test_zero_route_type_is_kept_in_path(monkeypatch):
+    client = PTVClient(DEV_ID, API_KEY)
+    monkeypatch.setattr(client._session, 'get', lambda url, **kwargs: FakeResponse({'url': url}))
+    assert f'/v3/runs/{RUN_ID}/route_type/0?' in client.get_run(RUN_ID, route_type=0)['url']
+
+# Batch Test
+def test_get_many_keeps_call_order(monkeypatch):
+    client = PTVClient(DEV_ID, API_KEY)
+    monkeypatch.setattr(client._session, 'get', lambda url, **kwargs: FakeResponse({'url': url}))
+    responses = client.get_many([('get_route', (ROUTE_ID,), {}), ('get_route_types', (), {})])
+    assert '/v3/routes/1?' in responses[0]['url']
+    assert '/v3/route_types?' in responses[1]['url']
+
+def test_async_client_gathers_calls():
+    async def fetch():
+        async with AsyncPTVClient(DEV_ID, API_KEY) as client:
+            client._client._session.get = lambda url, **kwargs: FakeResponse({'url': url})
+            return await asyncio.gather(client.get_route(ROUTE_ID), client.get_route_types())
+    responses = asyncio.run(fetch())
+    assert '/v3/routes/1?' in responses[0]['url']
+    assert '/v3/route_types?' in responses[1]['url']
+
+def test_async_client_matches_client_methods():
+    methods = {name for name in dir(PTVClient) if name.startswith('get_') or name == 'search'} - {'get_many'}
+    assert 'get_many_departures' in methods
+    for name in methods:
+        assert asyncio.iscoroutinefunction(getattr(AsyncPTVClient, name))
+    assert not hasattr(AsyncPTVClient, 'get_many')
+
+def test_async_client_rejects_streaming():
+    async def fetch():
+        async with AsyncPTVClient(DEV_ID, API_KEY) as client:
+            with raises(ValueError):
+                await client.get_routes(stream=True)
+            with raises(ValueError):
+                await client.get_many_departures(0, [FLINDERS_ST_STATION_STOP_ID], stream=True)
+    asyncio.run(fetch())
+
+# Caching Test
+def test_cache_honours_max_age(monkeypatch):
+    client = PTVClient(DEV_ID, API_KEY, cache_size=8)
+    calls = []
+    def get(url, headers=None, timeout=None):
+        calls.append(headers)
+        return FakeResponse({'status': {'health': 1}}, headers={'Cache-Control': 'max-age=60'})
+    monkeypatch.setattr(client._session, 'get', get)
+    assert client.get_route_types() == client.get_route_types()
+    assert len(calls) == 1
+
+def test_cache_falls_back_to_endpoint_ttl(monkeypatch):
+    client = PTVClient(DEV_ID, API_KEY, cache_size=8)
+    calls = []
+    def get(url, headers=None, timeout=None):
+        calls.append(headers)
+        return FakeResponse({'status': {'health': 1}})
+    monkeypatch.setattr(client._session, 'get', get)
+    client.get_route_types()
+    client.get_route_types()
+    assert len(calls) == 1
+    client.clear_cache()
+    client.get_route_types()
+    assert len(calls) == 2
+
+def test_cache_returns_fresh_dicts(monkeypatch):
+    client = PTVClient(DEV_ID, API_KEY, cache_size=4)
+    monkeypatch.setattr(client._session, 'get', lambda url, **kwargs: FakeResponse({'routes': [ALAMEIN_ROUTE], 'status': STATUS}))
+    client.get_routes()['routes'].clear()
+    client.get_routes()['routes'].clear()
+    assert client.get_routes()['routes'] == [ALAMEIN_ROUTE]
+
+def test_cache_file_survives_clients(monkeypatch, tmp_path):
+    cache_file = str(tmp_path / 'ptv.cache')
+    with PTVClient(DEV_ID, API_KEY, cache_size=8, cache_file=cache_file) as client:
+        monkeypatch.setattr(client._session, 'get', lambda url, **kwargs: FakeResponse({'status': {'health': 1}}))
+        first = client.get_route_types()
+    with PTVClient(DEV_ID, API_KEY, cache_size=8, cache_file=cache_file) as client:
+        monkeypatch.setattr(client._session, 'get', lambda url, **kwargs: None)
+        assert client.get_route_types() == first
+
+def test_cache_file_ignores_malformed_file(tmp_path):
+    cache_file = tmp_path / 'ptv.cache'
+    for content in ('[["https://timetableapi', 'null', '[1]', '{"a": 1}', '[["u", [null, {}]]]', '[["u", [null, {}, 0]]]', '[["u", ["e", "{}", "0"]]]'):
+        cache_file.write_text(content)
+        with PTVClient(DEV_ID, API_KEY, cache_size=8, cache_file=str(cache_file)) as client:
+            assert not client._cache
+        assert json.loads(cache_file.read_text()) == []
+
+def test_cache_file_drops_stale_entries(tmp_path):
+    cache_file = tmp_path / 'ptv.cache'
+    cache_file.write_text(json.dumps([
+        ['/stale', [None, '{}', 0]],
+        ['/stale_etag', ['"abc"', '{}', 0]],
+        ['/fresh', [None, '{}', 2 ** 40]],
+    ]))
+    client = PTVClient(DEV_ID, API_KEY, cache_size=8, cache_file=str(cache_file))
+    assert list(client._cache) == ['/stale_etag', '/fresh']
+
+def test_close_closes_session_when_saving_fails(monkeypatch, tmp_path):
+    client = PTVClient(DEV_ID, API_KEY, cache_size=8, cache_file=str(tmp_path / 'missing' / 'ptv.cache'))
+    closed = []
+    monkeypatch.setattr(client._session, 'close', lambda: closed.append(True))
+    with raises(OSError):
+        client.close()
+    assert closed == [True]
+
+def test_cache_revalidates_etag(monkeypatch):
+    client = PTVClient(DEV_ID, API_KEY, cache_size=8)
+    responses = [
+        FakeResponse({'status': {'health': 1}}, headers={'ETag': '"abc"', 'Cache-Control': 'no-cache'}),
+        FakeResponse(None, status_code=304, headers={'ETag': '"abc"'}),
+    ]
+    calls = []
+    def get(url, headers=None, timeout=None):
+        calls.append(headers)
+        return responses.pop(0)
+    monkeypatch.setattr(client._session, 'get', get)
+    first = client.get_route_types()
+    assert client.get_route_types() == first
+    assert calls == [None, {'If-None-Match': '"abc"'}]
+
+# Retry Test
+def test_retries_transient_errors_without_waiting_for_retry_after(monkeypatch):
+    attempts = []
+    class Unavailable(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            attempts.append(self.path)
+            self.send_response(503)
+            self.send_header('Retry-After', '3600')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        def log_message(self, *args):
+            pass
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Unavailable)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    backoffs = []
+    retry_after = []
+    monkeypatch.setattr(Retry, '_sleep_backoff', lambda self: backoffs.append(self.get_backoff_time()))
+    monkeypatch.setattr(Retry, 'sleep_for_retry', lambda self, response: retry_after.append(response) or True)
+    try:
+        with PTVClient(DEV_ID, API_KEY, not_secure=True) as client:
+            client._base_url = f"http://127.0.0.1:{server.server_port}"
+            with raises(requests.HTTPError):
+                client.get_route_types()
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert len(attempts) == 4
+    assert retry_after == []
+    assert len(backoffs) == 3 and max(backoffs) < 1
+
+# Streaming Test
+def test_stream_departures(monkeypatch):
+    importorskip('ijson')
+    client = PTVClient(DEV_ID, API_KEY)
+    body = {'departures': [{'run_id': 1}, {'run_id': 2}], 'status': {'health': 1}}
+    monkeypatch.setattr(client._session, 'get', lambda url, **kwargs: FakeResponse(body))
+    departures = client.get_departures_from_stop(0, FLINDERS_ST_STATION_STOP_ID, stream=True)
+    assert list(departures) == body['departures']
+
+def test_stream_routes(monkeypatch):
+    importorskip('ijson')
+    client = PTVClient(DEV_ID, API_KEY)
+    body = {'routes': [ALAMEIN_ROUTE], 'departures': [DEPARTURE], 'status': STATUS}
+    monkeypatch.setattr(client._session, 'get', lambda url, **kwargs: FakeResponse(body))
+    assert list(client.get_routes(stream=True)) == body['routes']
+
+def test_stream_pattern(monkeypatch):
+    importorskip('ijson')
+    client = PTVClient(DEV_ID, API_KEY)
+    body = {'departures': [DEPARTURE, dict(DEPARTURE, stop_id=1181)], 'runs': {'1': RUN}, 'status': STATUS}
+    monkeypatch.setattr(client._session, 'get', lambda url, **kwargs: FakeResponse(body))
+    assert list(client.get_pattern(RUN_ID, 0, 'all', stream=True)) == body['departures']
+
+def test_stream_closes_response_on_error(monkeypatch):
+    importorskip('ijson')
+    client = PTVClient(DEV_ID, API_KEY)
+    closed = []
+    response = FakeResponse(None, status_code=500)
+    response.close = lambda: closed.append(True)
+    monkeypatch.setattr(client._session, 'get', lambda url, **kwargs: response)
+    with raises(requests.HTTPError):
+        client.get_departures_from_stop(0, FLINDERS_ST_STATION_STOP_ID, stream=True)
+    assert closed == [True]